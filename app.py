@@ -1,10 +1,27 @@
+import os
+import logging
+import asyncio
+import re
+import pickle
+import queue
+import threading
+import time
+import ahocorasick
+import faiss
+import numpy as np
+import orjson
 import streamlit as st
 import requests
-import pandas as pd
 import gspread
-from openai import OpenAI
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from openai import AsyncOpenAI
 from google.oauth2.service_account import Credentials
 from urllib.parse import urlparse
+from datetime import datetime
+from collections import deque
+
+logger = logging.getLogger(__name__)
 
 # === 🔐 Load from secrets ===
 GOOGLE_API_KEY = st.secrets["google"]["api_key"]
@@ -14,15 +31,29 @@ GOOGLE_SHEET_NAME = st.secrets["google"]["sheet_name"]
 GCP_SERVICE_ACCOUNT = st.secrets["gcp_service_account"]
 
 # === 🤖 OpenAI Client ===
-client = OpenAI(api_key=OPENAI_API_KEY)
+# One AsyncOpenAI client on one long-lived event loop for the whole process, so
+# its pooled connections to api.openai.com are reused across clicks. Coroutines
+# are submitted to the loop with asyncio.run_coroutine_threadsafe.
+@st.cache_resource(show_spinner=False)
+def get_openai_runtime():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop, AsyncOpenAI(api_key=OPENAI_API_KEY)
 
 # === Trusted Medical Sources ===
-TRUSTED_SITES = [
-    "site:nhs.uk", "site:nih.gov", "site:mayoclinic.org", "site:who.int",
-    "site:cdc.gov", "site:clevelandclinic.org", "site:health.harvard.edu",
-    "site:pubmed.ncbi.nlm.nih.gov", "site:webmd.com", "site:medlineplus.gov"
+# The Programmable Search Engine (GOOGLE_CX) should list these as "Sites to search"
+# with "Search only included sites" enabled, so the query text needs no site: filter.
+# Results are still checked against this list, in case the engine is misconfigured.
+TRUSTED_DOMAINS = [
+    "nhs.uk", "nih.gov", "mayoclinic.org", "who.int",
+    "cdc.gov", "clevelandclinic.org", "health.harvard.edu",
+    "pubmed.ncbi.nlm.nih.gov", "webmd.com", "medlineplus.gov"
 ]
 
+def is_trusted_link(link):
+    host = (urlparse(link).hostname or "").lower()
+    return any(host == domain or host.endswith("." + domain) for domain in TRUSTED_DOMAINS)
+
 # === Trust Score Function ===
 def compute_trust_score(link, snippet):
     domain = urlparse(link).netloc.lower()
@@ -44,57 +75,267 @@ def compute_trust_score(link, snippet):
     return min(score, 5.0)
 
 # === Google Search ===
+# One keep-alive session per process so the TLS handshake is not repeated per query.
+@st.cache_resource(show_spinner=False)
+def get_http_session():
+    session = requests.Session()
+    retry = Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry))
+    return session
+
+# Cached per (query, num_results); failures raise so they are never cached.
+@st.cache_data(ttl=3600, show_spinner=False)
+def search_trusted_sources(query, num_results=5):
+    params = {"key": GOOGLE_API_KEY, "cx": GOOGLE_CX, "q": query, "num": num_results}
+    response = get_http_session().get("https://www.googleapis.com/customsearch/v1", params=params, timeout=(3, 10))
+    response.raise_for_status()
+    items = orjson.loads(response.content).get("items", [])
+    untrusted = [item.get("link", "") for item in items if not is_trusted_link(item.get("link", ""))]
+    if untrusted:
+        logger.warning("Dropping %d results outside TRUSTED_DOMAINS (check the GOOGLE_CX site list): %s", len(untrusted), untrusted)
+        items = [item for item in items if is_trusted_link(item.get("link", ""))]
+    # NHS pages first, otherwise in Google's order.
+    nhs, rest = [], []
+    for item in items:
+        (nhs if "nhs.uk" in item.get("link", "") else rest).append(item)
+    items = nhs + rest
+
+    results = []
+    for item in items:
+        title = item["title"]
+        link = item["link"]
+        snippet = item["snippet"]
+        score = compute_trust_score(link, snippet)
+        results.append((title, link, snippet, score))
+    return results
+
 def get_medical_snippets(query, num_results=5):
-    domain_query = " OR ".join(TRUSTED_SITES)
-    full_query = f"{query} ({domain_query})"
-    params = {"key": GOOGLE_API_KEY, "cx": GOOGLE_CX, "q": full_query, "num": num_results}
     try:
-        response = requests.get("https://www.googleapis.com/customsearch/v1", params=params)
-        response.raise_for_status()
-        items = response.json().get("items", [])
-        items.sort(key=lambda x: 0 if "nhs.uk" in x.get("link", "") else 1)
-
-        results = []
-        for item in items:
-            title = item["title"]
-            link = item["link"]
-            snippet = item["snippet"]
-            score = compute_trust_score(link, snippet)
-            results.append((title, link, snippet, score))
-        return results
+        return search_trusted_sources(query, num_results)
     except Exception:
         return []
 
-# === ChatGPT Answering ===
-def answer_medical_question(question):
-    snippets = get_medical_snippets(question)
-    if not snippets:
-        return "Sorry, no reliable sources available now.", []
+# === Semantic Answer Cache ===
+# Paraphrased questions reuse a stored answer when their embeddings are close enough.
+# Only the question is embedded; a hit also needs identical demographics, so an
+# answer written for one age or sex is never served to another.
+# Each record is (vector, (created, demographics, question, answer, sources)).
+# New records are appended to an on-disk log; once the cap is exceeded, expired
+# and oldest records are dropped and the log is rewritten, so the O(N) rewrite
+# happens once per SEMANTIC_CACHE_MAX_ENTRIES // 4 stores rather than on each one.
+SEMANTIC_CACHE_PATH = os.path.expanduser("~/.cache/med_assistant.log")
+SEMANTIC_CACHE_THRESHOLD = 0.95
+SEMANTIC_CACHE_TTL = 24 * 3600
+SEMANTIC_CACHE_MAX_ENTRIES = 1000
+SEMANTIC_CACHE_CANDIDATES = 8
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+async def embed_question(aclient, question):
+    response = await aclient.embeddings.create(model=EMBEDDING_MODEL, input=question)
+    embedding = response.data[0].embedding
+    emb = np.array([embedding], dtype="float32")
+    faiss.normalize_L2(emb)
+    return emb
+
+def read_semantic_log():
+    records = []
+    try:
+        with open(SEMANTIC_CACHE_PATH, "rb") as f:
+            while True:
+                records.append(pickle.load(f))
+    except (FileNotFoundError, EOFError):
+        pass
+    except Exception:
+        logger.exception("Semantic cache log is unreadable past record %d", len(records))
+    return records
 
-    context = "\n".join(f"- **{title}**: {snippet}" for title, link, snippet, score in snippets)
-    sources = [(title, link, snippet, score) for title, link, snippet, score in snippets]
+def write_semantic_log(records):
+    try:
+        os.makedirs(os.path.dirname(SEMANTIC_CACHE_PATH), exist_ok=True)
+        tmp_path = SEMANTIC_CACHE_PATH + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for record in records:
+                pickle.dump(record, f)
+        os.replace(tmp_path, SEMANTIC_CACHE_PATH)
+    except OSError:
+        logger.exception("Could not rewrite the semantic cache log")
+
+def rebuild_semantic_index(cache, records, keep):
+    """Keep the newest `keep` unexpired records and rebuild the index over them."""
+    cutoff = time.time() - SEMANTIC_CACHE_TTL
+    records = [r for r in records if r[1][0] > cutoff][-keep:]
+    cache["records"], cache["index"] = records, None
+    if records:
+        vectors = np.stack([vector for vector, _ in records])
+        cache["index"] = faiss.IndexFlatIP(vectors.shape[1])
+        cache["index"].add(vectors)
+
+@st.cache_resource(show_spinner=False)
+def load_semantic_cache():
+    cache = {"lock": threading.Lock()}
+    try:
+        rebuild_semantic_index(cache, read_semantic_log(), SEMANTIC_CACHE_MAX_ENTRIES)
+    except Exception:
+        logger.exception("Semantic cache log is unusable; starting empty")
+        rebuild_semantic_index(cache, [], SEMANTIC_CACHE_MAX_ENTRIES)
+    return cache
 
-    prompt = f"""
-Answer clearly using snippets below.
-Mention both common and serious conditions if symptoms provided.
-End with: "Talk to a doctor to be sure."
+# The cache is only an optimisation: any failure in it is logged and treated
+# as a miss (lookup) or skipped (store), never surfaced to the user.
+def semantic_lookup(emb, demographics):
+    try:
+        cache = load_semantic_cache()
+        cutoff = time.time() - SEMANTIC_CACHE_TTL
+        with cache["lock"]:
+            index = cache["index"]
+            if index is None or index.d != emb.shape[1]:
+                return None
+            scores, ids = index.search(emb, min(SEMANTIC_CACHE_CANDIDATES, index.ntotal))
+            for score, i in zip(scores[0], ids[0]):
+                if score <= SEMANTIC_CACHE_THRESHOLD:
+                    break
+                created, entry_demographics, _, answer, sources = cache["records"][i][1]
+                if entry_demographics == demographics and created > cutoff:
+                    return answer, sources
+    except Exception:
+        logger.exception("Semantic cache lookup failed; treating it as a miss")
+    return None
 
-Snippets:
-{context}
+def semantic_store(emb, demographics, question, answer, sources):
+    try:
+        record = (emb[0], (time.time(), demographics, question, answer, sources))
+        cache = load_semantic_cache()
+        with cache["lock"]:
+            if cache["index"] is not None and cache["index"].d != emb.shape[1]:
+                # EMBEDDING_MODEL changed: old vectors cannot be compared with new ones.
+                logger.warning("Embedding size changed to %d; clearing the semantic cache", emb.shape[1])
+                rebuild_semantic_index(cache, [], SEMANTIC_CACHE_MAX_ENTRIES)
+                write_semantic_log([])
+            if cache["index"] is None:
+                cache["index"] = faiss.IndexFlatIP(emb.shape[1])
+            cache["index"].add(emb)
+            cache["records"].append(record)
+            if len(cache["records"]) > SEMANTIC_CACHE_MAX_ENTRIES:
+                rebuild_semantic_index(cache, cache["records"], SEMANTIC_CACHE_MAX_ENTRIES * 3 // 4)
+                write_semantic_log(cache["records"])
+                return
+            os.makedirs(os.path.dirname(SEMANTIC_CACHE_PATH), exist_ok=True)
+            with open(SEMANTIC_CACHE_PATH, "ab") as f:
+                pickle.dump(record, f)
+    except Exception:
+        logger.exception("Could not store the answer in the semantic cache")
 
-Question: {question}
+# === ChatGPT Answering ===
+ANSWER_CACHE_TTL = 3600
+
+# Kept byte-identical across calls so it forms a stable, cacheable prompt prefix.
+SYSTEM_PROMPT = (
+    "Answer clearly using the snippets provided by the user.\n"
+    "Mention both common and serious conditions if symptoms provided.\n"
+    'End with: "Talk to a doctor to be sure."'
+)
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_question(question):
+    return WHITESPACE_RE.sub(" ", question.strip().lower())
+
+# Questions this short cannot be answered usefully, so skip search and OpenAI entirely.
+CLARIFICATION_MESSAGE = "Please provide a bit more detail (symptoms, duration, etc.)."
+
+def needs_more_detail(question):
+    return len(question.split()) < 3 or len(question.strip()) < 10
+
+# Exact-match answers keyed on (demographics, normalized question), shared by all sessions.
+# Held in a plain dict rather than st.cache_data because answers stream into a placeholder.
+@st.cache_resource(show_spinner=False)
+def get_answer_cache():
+    return {"entries": {}, "lock": threading.Lock()}
+
+async def fetch_context(aclient, query, key):
+    # The search and the embedding are independent round trips, so run them side by side.
+    # The search stays on the pooled requests session, in a worker thread.
+    # The embedding only feeds the semantic cache, so its failure must not block the answer.
+    snippets, emb = await asyncio.gather(
+        asyncio.to_thread(get_medical_snippets, query),
+        embed_question(aclient, key),
+        return_exceptions=True
+    )
+    if isinstance(emb, Exception):
+        logger.warning("Question embedding failed; skipping the semantic cache: %s", emb)
+        emb = None
+    return snippets, emb
+
+async def stream_chat(aclient, messages, tokens):
+    # Runs on the OpenAI loop thread, which cannot touch Streamlit elements, so
+    # deltas are handed to the script thread through `tokens`; None marks the end.
+    try:
+        stream = await aclient.chat.completions.create(model="gpt-4o", messages=messages, stream=True)
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                tokens.put(delta)
+    finally:
+        tokens.put(None)
+
+def generate_answer(key, question, demographics, placeholder):
+    loop, aclient = get_openai_runtime()
+    full_query = demographics + question
+    snippets, emb = asyncio.run_coroutine_threadsafe(fetch_context(aclient, full_query, key), loop).result()
+
+    cached = semantic_lookup(emb, demographics) if emb is not None else None
+    if cached:
+        return cached
 
-Answer:
-"""
+    if not snippets:
+        raise LookupError("No reliable sources available.")
+
+    context = "\n".join(f"- **{title}**: {snippet}" for title, link, snippet, score in snippets)
+    sources = [(title, link, snippet, score) for title, link, snippet, score in snippets]
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Snippets:\n{context}\n\nQuestion: {full_query}"}
+    ]
+
+    tokens = queue.Queue()
+    done = asyncio.run_coroutine_threadsafe(stream_chat(aclient, messages, tokens), loop)
+    parts = []
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        answer = response.choices[0].message.content.strip()
-        return answer + "\n\n**Disclaimer:** Always consult your healthcare provider.", sources
-    except Exception as e:
-        return f"OpenAI API Error: {e}", []
+        for delta in iter(tokens.get, None):
+            parts.append(delta)
+            placeholder.markdown("".join(parts))
+        done.result()
+    finally:
+        done.cancel()
+    answer = "".join(parts).strip()
+    answer += "\n\n**Disclaimer:** Always consult your healthcare provider."
+    if emb is not None:
+        semantic_store(emb, demographics, key, answer, sources)
+    return answer, sources
+
+def answer_medical_question(question, demographics, placeholder):
+    """Stream the answer into placeholder and return (answer, sources)."""
+    key = normalize_question(question)
+    cache = get_answer_cache()
+    with cache["lock"]:
+        hit = cache["entries"].get((demographics, key))
+    if hit and time.monotonic() - hit[0] < ANSWER_CACHE_TTL:
+        answer, sources = hit[1]
+    else:
+        try:
+            answer, sources = generate_answer(key, question, demographics, placeholder)
+            now = time.monotonic()
+            with cache["lock"]:
+                entries = cache["entries"]
+                for stale in [k for k, (t, _) in entries.items() if now - t >= ANSWER_CACHE_TTL]:
+                    del entries[stale]
+                entries[(demographics, key)] = (now, (answer, sources))
+        except LookupError:
+            answer, sources = "Sorry, no reliable sources available now.", []
+        except Exception as e:
+            answer, sources = f"OpenAI API Error: {e}", []
+    placeholder.markdown(answer)
+    return answer, sources
 
 # === Proactive Advisories ===
 RISK_SNIPPETS = {
@@ -109,9 +350,6 @@ RISK_SNIPPETS = {
     "rash": "If rash is accompanied by fever or trouble breathing, see a doctor quickly."
 }
 
-def get_risk_snippets(query):
-    return [snippet for keyword, snippet in RISK_SNIPPETS.items() if keyword in query.lower()]
-
 # === Severity Categorization ===
 SEVERITY_KEYWORDS = {
     "🔴 Immediate": ["chest pain", "vision loss", "stroke", "aneurysm", "severe headache"],
@@ -119,14 +357,106 @@ SEVERITY_KEYWORDS = {
     "🟢 Routine": []
 }
 
-def classify_severity(query):
-    q = query.lower()
-    for level, words in SEVERITY_KEYWORDS.items():
-        if any(w in q for w in words):
-            return level
-    return "🟢 Routine"
+# === Keyword Scanner ===
+# One Aho-Corasick automaton over both tables, so a query is scanned in a single pass.
+# Lower rank = higher severity (dict order of SEVERITY_KEYWORDS).
+SEVERITY_LEVELS = list(SEVERITY_KEYWORDS)
+
+def build_keyword_automaton():
+    routine = len(SEVERITY_LEVELS) - 1
+    ranks = {}
+    for rank, words in enumerate(SEVERITY_KEYWORDS.values()):
+        for kw in words:
+            ranks.setdefault(kw, rank)
+
+    # Each payload carries the keyword's position in RISK_SNIPPETS (None if it has
+    # no advisory), so advisories come back in dict order, not match order.
+    order = {kw: i for i, kw in enumerate(RISK_SNIPPETS)}
+    automaton = ahocorasick.Automaton()
+    for kw in {**RISK_SNIPPETS, **ranks}:
+        automaton.add_word(kw, (order.get(kw), ranks.get(kw, routine)))
+    automaton.make_automaton()
+    return automaton
+
+KEYWORD_AUTOMATON = build_keyword_automaton()
+RISK_SNIPPET_LIST = list(RISK_SNIPPETS.values())
+
+def scan_query(query):
+    """Return (risk advisories, severity level) for a question."""
+    matched = set()
+    rank = len(SEVERITY_LEVELS) - 1
+    for _, (order, kw_rank) in KEYWORD_AUTOMATON.iter(query.lower()):
+        if order is not None:
+            matched.add(order)
+        rank = min(rank, kw_rank)
+    return [RISK_SNIPPET_LIST[i] for i in sorted(matched)], SEVERITY_LEVELS[rank]
+
+# === Feedback Sheet ===
+# Authorized on first submit, then shared by every session in this process.
+@st.cache_resource(show_spinner=False)
+def get_feedback_sheet():
+    creds = Credentials.from_service_account_info(GCP_SERVICE_ACCOUNT, scopes=[
+        "https://spreadsheets.google.com/feeds",
+        "https://www.googleapis.com/auth/drive"
+    ])
+    return gspread.authorize(creds).open(GOOGLE_SHEET_NAME).sheet1
+
+# Submissions are queued and written in batches by a background thread, so
+# the form never waits on Google Sheets. append_rows sends one request per batch.
+# Rows are [rating, comments, timestamp]: the timestamp is last so new rows
+# line up with the existing [rating, comments] columns.
+FEEDBACK_BATCH_SIZE = 5
+FEEDBACK_FLUSH_SECONDS = 30
+FEEDBACK_MAX_RETRIES = 5
+FEEDBACK_MAX_PENDING = 100
+
+def flush_feedback_forever(pending):
+    batch = []
+    deadline = None
+    failures = 0
+    while True:
+        try:
+            timeout = max(0, deadline - time.monotonic()) if batch else None
+            batch.append(pending.get(timeout=timeout))
+            if deadline is None:
+                deadline = time.monotonic() + FEEDBACK_FLUSH_SECONDS
+        except queue.Empty:
+            pass
+        if len(batch) > FEEDBACK_MAX_PENDING:
+            logger.error("Dropping %d oldest feedback rows; %d are pending", len(batch) - FEEDBACK_MAX_PENDING, len(batch))
+            del batch[:-FEEDBACK_MAX_PENDING]
+        if not batch:
+            continue
+        # A full batch is written early, except while backing off after a failure.
+        due = time.monotonic() >= deadline
+        if due or (not failures and len(batch) >= FEEDBACK_BATCH_SIZE):
+            try:
+                get_feedback_sheet().append_rows(batch, value_input_option="RAW")
+                batch, deadline, failures = [], None, 0
+            except Exception:
+                failures += 1
+                if failures >= FEEDBACK_MAX_RETRIES:
+                    logger.exception("Dropping %d feedback rows after %d failed writes", len(batch), failures)
+                    batch, deadline, failures = [], None, 0
+                else:
+                    logger.exception("Writing %d feedback rows failed; retrying in %ds", len(batch), FEEDBACK_FLUSH_SECONDS)
+                    deadline = time.monotonic() + FEEDBACK_FLUSH_SECONDS
+
+@st.cache_resource(show_spinner=False)
+def get_feedback_queue():
+    pending = queue.Queue()
+    threading.Thread(target=flush_feedback_forever, args=(pending,), daemon=True).start()
+    return pending
 
 # === Streamlit UI ===
+HISTORY_LIMIT = 50
+HISTORY_VISIBLE = 10
+
+def render_history_entry(i, entry):
+    st.markdown(f"**Q{i}: {entry['Question']}** ({entry['Severity']})")
+    st.write(entry['Answer'])
+    st.markdown("---")
+
 st.set_page_config(page_title="AI Medical Assistant", page_icon="🩺", layout="centered")
 st.title("🩺 AI-Powered Medical Assistant")
 
@@ -136,21 +466,25 @@ user_gender = st.sidebar.selectbox("Your Gender (optional)", ["Prefer not to say
 tab1, tab2 = st.tabs(["🧠 Ask Question", "📜 History"])
 
 if "history" not in st.session_state:
-    st.session_state.history = []
+    st.session_state.history = deque(maxlen=HISTORY_LIMIT)
 
 with tab1:
     question = st.text_input("Enter your medical question:")
     if st.button("Get Answer") and question:
         demographics = f"For a {user_age}-year-old {user_gender.lower()}, " if user_age or user_gender != "Prefer not to say" else ""
-        full_query = demographics + question
-        with st.spinner("Generating response..."):
-            answer, sources = answer_medical_question(full_query)
-            risk_advisories = get_risk_snippets(question)
-            severity = classify_severity(question)
+        risk_advisories, severity = scan_query(question)
 
         st.markdown(f"### 🚨 Severity Level: {severity}")
         st.markdown("### ✅ Answer")
-        st.write(answer)
+        answer_placeholder = st.empty()
+        too_vague = needs_more_detail(question)
+        if too_vague:
+            answer, sources = CLARIFICATION_MESSAGE, []
+            answer_placeholder.markdown(answer)
+        else:
+            # Shown until the first streamed token replaces it.
+            answer_placeholder.caption("⏳ Generating response...")
+            answer, sources = answer_medical_question(question, demographics, answer_placeholder)
 
         if risk_advisories:
             st.markdown("### ⚠️ Proactive Health Advisory")
@@ -163,40 +497,39 @@ with tab1:
                 stars = "⭐" * int(score)
                 st.markdown(f"- [{title}]({link}) ({stars})\n\n> {snippet}")
 
-        st.session_state.history.append({
-            "Question": question,
-            "Answer": answer,
-            "Sources": sources,
-            "Severity": severity
-        })
+        # A clarification request is not an answer, so it stays out of history.
+        if not too_vague:
+            st.session_state.history.append({
+                "Question": question,
+                "Answer": answer,
+                "Sources": [link for _, link, _, _ in sources],
+                "Severity": severity
+            })
 
 with tab2:
     st.markdown("### 📜 Your Session History")
     if not st.session_state.history:
         st.info("No questions asked yet.")
     else:
-        for i, entry in enumerate(reversed(st.session_state.history), 1):
-            st.markdown(f"**Q{i}: {entry['Question']}** ({entry['Severity']})")
-            st.write(entry['Answer'])
-            st.markdown("---")
+        entries = list(reversed(st.session_state.history))
+        for i, entry in enumerate(entries[:HISTORY_VISIBLE], 1):
+            render_history_entry(i, entry)
+        if len(entries) > HISTORY_VISIBLE:
+            with st.expander(f"Show older ({len(entries) - HISTORY_VISIBLE})"):
+                for i, entry in enumerate(entries[HISTORY_VISIBLE:], HISTORY_VISIBLE + 1):
+                    render_history_entry(i, entry)
 
 # === Feedback Form ===
 st.markdown("---")
 st.markdown("### 💬 Leave Feedback")
 
-creds = Credentials.from_service_account_info(GCP_SERVICE_ACCOUNT, scopes=[
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/drive"
-])
-gc = gspread.authorize(creds)
-feedback_sheet = gc.open(GOOGLE_SHEET_NAME).sheet1
-
 with st.form("feedback_form"):
     st.markdown("*(Optional)* Rate your experience and provide feedback.")
     rating = st.radio("How would you rate your experience?", ["⭐", "⭐⭐", "⭐⭐⭐", "⭐⭐⭐⭐", "⭐⭐⭐⭐⭐"], index=4, horizontal=True)
     comments = st.text_area("Your Feedback")
     if st.form_submit_button("Submit Feedback"):
-        feedback_sheet.append_row([rating, comments])
+        timestamp = datetime.now().isoformat(timespec="seconds")
+        get_feedback_queue().put([rating, comments, timestamp])
         st.success("✅ Thank you for your feedback!")
 
 # === Footer ===